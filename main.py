@@ -3,13 +3,21 @@
 from streamlit_extras.stylable_container import stylable_container
 import streamlit as st  # For building the web app interface
 import hashlib  # For password hashing and security functions
+import hmac  # For constant-time hash comparison
+from collections import OrderedDict  # For the LRU verification cache
 from cryptography.fernet import Fernet  # For encryption/decryption
-import json  # For handling data storage in JSON format
+from cryptography.hazmat.primitives import hashes  # Digest for key derivation
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC  # Compiled PBKDF2
+import orjson  # For fast JSON (de)serialization of stored data
 import os  # For file system operations
-import time  # For adding delays in the UI
-# For handling timestamps and lockout periods
+import time  # For UI delays and monotonic lockout timing
+# For handling storage timestamps
 from datetime import datetime, timedelta
 import base64  # For encoding/decoding
+import binascii  # For catching malformed base64 in stored hashes
+import secrets  # For cryptographically secure salt generation
+import tempfile  # For unique temp files when rewriting the data file
+import threading  # For serializing data file writes across sessions
 import qrcode  # For QR code generation
 from io import BytesIO  # For handling byte streams
 import matplotlib.pyplot as plt  # For password strength visualization
@@ -30,21 +38,20 @@ st.set_page_config(
 # Constants
 MAX_ATTEMPTS = 3  # Maximum failed login attempts before lockout
 LOCKOUT_TIME = 300  # 5 minutes in seconds for lockout duration
-DATA_FILE = "encrypted_data.json"  # File to store encrypted data
+PBKDF2_ITERATIONS = 100000  # High iteration count for security
+PBKDF2_CACHE_SIZE = 128  # Max verified passkey hashes remembered per session
+DATA_FILE = "encrypted_data.ndjson"  # Append-only log of encrypted records
+LEGACY_DATA_FILE = "encrypted_data.json"  # Older single-document data file
+PREVIEW_LENGTH = 200  # Characters of ciphertext shown in the Data Vault
+VAULT_PAGE_SIZE = 20  # Items rendered per Data Vault page
 # Hardcoded master password (Note: In production, use environment variables)
 MASTER_PASSWORD = "admin123"
 
 # Custom CSS for enhanced UI
 
 
-def local_css(file_name):
-    """Load custom CSS styles from a file and inject additional styles"""
-
-
-    with open(file_name) as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
-    # Additional CSS for gradient text consistency
-    st.markdown("""
+# Additional CSS for gradient text consistency
+ADDITIONAL_CSS = """
     <style>
     .gradient-text {
         background-clip: text !important;
@@ -82,7 +89,19 @@ def local_css(file_name):
         color: #f44336;
     }
     </style>
-    """, unsafe_allow_html=True)
+    """
+
+
+@st.cache_data
+def build_css(file_name, mtime_ns):
+    """Compose the style block; the mtime argument keys the cache to the file version"""
+    with open(file_name) as f:
+        return f"<style>{f.read()}</style>" + ADDITIONAL_CSS
+
+
+def local_css(file_name):
+    """Load custom CSS styles from a file and inject additional styles"""
+    st.markdown(build_css(file_name, os.stat(file_name).st_mtime_ns), unsafe_allow_html=True)
 
 # Background and styling
 def set_bg_hack():
@@ -98,14 +117,102 @@ def set_bg_hack():
         unsafe_allow_html=True
     )
 
+# Data management functions
+def make_preview(encrypted_text):
+    """Truncate ciphertext for display in the Data Vault"""
+    if len(encrypted_text) > PREVIEW_LENGTH:
+        return encrypted_text[:PREVIEW_LENGTH] + "..."
+    return encrypted_text
+
+@st.cache_resource
+def get_data_lock():
+    """Return the lock serializing data file writes across all sessions in this process"""
+    return threading.Lock()
+
+def parse_data_file(path):
+    """Replay the record log into (data, record count)"""
+    data = {}
+    record_count = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue  # Skip blank lines
+            record = orjson.loads(line)
+            if "preview" not in record:
+                record["preview"] = make_preview(record["encrypted_text"])  # Backfill older records
+            data[record.pop("name")] = record  # Later records replace earlier ones
+            record_count += 1
+    return data, record_count
+
+@st.cache_data
+def read_data_file(path, mtime_ns):
+    """Cached parse of the record log; the mtime argument keys the cache to the file version"""
+    return parse_data_file(path)
+
+def write_data_file(data):
+    """Rewrite the data file with exactly one record per stored item (caller holds the data lock)"""
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(DATA_FILE)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for name, entry in data.items():
+                f.write(orjson.dumps({"name": name, **entry}, option=orjson.OPT_APPEND_NEWLINE))
+        os.replace(tmp_file, DATA_FILE)  # Swap in the new file atomically
+    except BaseException:
+        os.remove(tmp_file)  # Don't leave a partial temp file behind
+        raise
+    read_data_file.clear()  # Drop the cached parse of the old file
+
+def load_data():
+    """Load encrypted data from file or return empty dict if no file exists"""
+    try:
+        mtime_ns = os.stat(DATA_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return load_legacy_data()
+    data, record_count = read_data_file(DATA_FILE, mtime_ns)
+    if record_count > 2 * len(data):
+        with get_data_lock():
+            # Re-read under the lock so records appended by other sessions are kept
+            data, record_count = parse_data_file(DATA_FILE)
+            if record_count > 2 * len(data):
+                write_data_file(data)  # Compact once overwritten records dominate the log
+    return data
+
+def load_legacy_data():
+    """Migrate data from the older single-document file, if there is any"""
+    try:
+        with open(LEGACY_DATA_FILE, "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    if not content.strip():
+        return {}
+    data = orjson.loads(content)
+    for entry in data.values():
+        entry["preview"] = make_preview(entry["encrypted_text"])
+    with get_data_lock():
+        if os.path.exists(DATA_FILE):
+            return parse_data_file(DATA_FILE)[0]  # Another session already migrated
+        write_data_file(data)  # One-time migration to the record log
+    return data
+
+def save_data(name, entry):
+    """Append a single encrypted record to the data file"""
+    with get_data_lock():
+        with open(DATA_FILE, "ab") as f:
+            f.write(orjson.dumps({"name": name, **entry}, option=orjson.OPT_APPEND_NEWLINE))
+    read_data_file.clear()  # Drop the cached parse of the old file
+
 # Generate or load encryption key
 def get_encryption_key():
     """Get or create the encryption key file"""
-    if not os.path.exists("secret.key"):
+    try:
+        with open("secret.key", "rb") as key_file:
+            return key_file.read()  # Return the existing key
+    except FileNotFoundError:
         key = Fernet.generate_key()  # Generate a new key if none exists
         with open("secret.key", "wb") as key_file:
             key_file.write(key)  # Save the key to file
-    return open("secret.key", "rb").read()  # Return the existing key
+        return key
 
 # UI Components
 def gradient_text(text, color1, color2, key=None):
@@ -130,6 +237,48 @@ def card_component(title, content, icon):
     </div>
     """
 
+# Static HTML blocks, built once at import instead of on every rerun
+SIDEBAR_HEADER_HTML = """
+<div class="sidebar-header" style="margin-bottom: 20px;">
+    <h1 style="margin-bottom: 0;">🔐 Secure Vault</h1>
+    <p class="subtitle" style="margin-top: 0; color: #666; font-size: 14px;">Military-Grade Data Protection</p>
+</div>
+"""
+
+DASHBOARD_STATS_HTML = """
+<div style="margin-bottom: 30px;">
+    <h1 style="margin-bottom: 5px;">Dashboard</h1>
+    <div style="display: flex; gap: 20px; margin-top: 20px;">
+        <div style="background: white; padding: 15px; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); width: 200px;">
+            <p style="margin: 0; font-size: 14px; color: #666;">Security System</p>
+            <p style="margin: 5px 0 0; font-size: 16px; font-weight: bold; color: #4CAF50;">Active</p>
+        </div>
+        <div style="background: white; padding: 15px; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); width: 200px;">
+            <p style="margin: 0; font-size: 14px; color: #666;">Encrypted Items</p>
+            <p style="margin: 5px 0 0; font-size: 16px; font-weight: bold;">{}</p>
+        </div>
+    </div>
+</div>
+"""  # Filled with the item count when rendered
+
+DASHBOARD_CARDS_HTML = (
+    card_component(
+        "Bank-Level Security",
+        "AES-256 encryption with PBKDF2 key derivation",
+        "🛡️"
+    ),
+    card_component(
+        "Zero-Knowledge Protocol",
+        "We never store or see your passkeys",
+        "🔒"
+    ),
+    card_component(
+        "Military Compliance",
+        "Meets strictest security standards",
+        "🎖️"
+    ),
+)
+
 # QR Code Generation
 def generate_qr_code(data):
     """Generate QR code from data and return as bytes"""
@@ -229,9 +378,13 @@ def visualize_password_strength(score, container_width=400):
     return fig
 # Main application function
 def main():
-    # Initialize encryption
-    KEY = get_encryption_key()
-    cipher = Fernet(KEY)  # Create Fernet cipher instance
+    # Initialize encryption once per session
+    if 'cipher' not in st.session_state:
+        key = get_encryption_key()
+        st.session_state.cipher = Fernet(key)  # Create Fernet cipher instance
+        # Pepper for the verification cache, derived from the key so it never hits the data file
+        st.session_state.pepper = hmac.new(key, b"pbkdf2-cache-pepper", hashlib.sha256).digest()
+    cipher = st.session_state.cipher
     
     # Initialize session state variables
     if 'failed_attempts' not in st.session_state:
@@ -239,61 +392,110 @@ def main():
     if 'locked_out' not in st.session_state:
         st.session_state.locked_out = False  # Track if user is locked out
     if 'lockout_time' not in st.session_state:
-        st.session_state.lockout_time = None  # Track when lockout started
+        st.session_state.lockout_time = None  # Monotonic time when lockout started
     if 'menu_choice' not in st.session_state:
         st.session_state.menu_choice = "Dashboard"  # Track current menu selection
     if 'scanned_data' not in st.session_state:
         st.session_state.scanned_data = ''
-
-    # Data management functions
-    def load_data():
-        """Load encrypted data from file or return empty dict if no file exists"""
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, "r") as f:
-                return json.load(f)
-        return {}
-
-    def save_data(data):
-        """Save encrypted data to file"""
-        with open(DATA_FILE, "w") as f:
-            json.dump(data, f)
+    if 'pbkdf2_cache' not in st.session_state:
+        st.session_state.pbkdf2_cache = OrderedDict()  # Session-only LRU of verified hashes
 
     stored_data = load_data()  # Load existing data at startup
+    # Index entry names by ciphertext so decryption looks up its entry in O(1)
+    ct_index = {value["encrypted_text"]: name for name, value in stored_data.items()}
 
     # Security functions
     def hash_passkey(passkey, salt=None):
-        """Hash a passkey with salt using PBKDF2 for secure storage"""
+        """Hash a UTF-8 encoded passkey with salt using PBKDF2 for secure storage"""
         if salt is None:
-            salt = os.urandom(16).hex()  # Generate a random salt if none provided
-        # Using PBKDF2 with 100,000 iterations for key derivation
-        hashed = hashlib.pbkdf2_hmac(
-            'sha256',
-            passkey.encode('utf-8'),
-            salt.encode('utf-8'),
-            100000  # High iteration count for security
-        )
-        return f"{salt}${hashed.hex()}"  # Return salt and hash combined
+            salt = secrets.token_bytes(16)  # Generate a random salt if none provided
+        # Using PBKDF2-HMAC-SHA512 from the compiled cryptography backend
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA512(), length=32, salt=salt, iterations=PBKDF2_ITERATIONS)
+        hashed = kdf.derive(passkey)
+        # Return version, salt and hash combined, stored as base64
+        return f"v3${base64.b64encode(salt).decode()}${base64.b64encode(hashed).decode()}"
+
+    def hash_legacy_passkey(passkey, salt, algorithm):
+        """Recreate a hash from the older v2 and unversioned formats"""
+        return hashlib.pbkdf2_hmac(algorithm, passkey, salt, PBKDF2_ITERATIONS, dklen=32)
+
+    def parse_stored_hash(stored_hash):
+        """Split a stored hash into (algorithm, salt bytes, hash bytes), or None if malformed"""
+        if not stored_hash or '$' not in stored_hash:
+            return None  # Invalid hash format
+        parts = stored_hash.split('$')
+        try:
+            if len(parts) == 3 and parts[0] == 'v3':
+                # Current format: v3$base64 salt$base64 hash
+                return None, base64.b64decode(parts[1], validate=True), base64.b64decode(parts[2], validate=True)
+            if len(parts) == 3 and parts[0] == 'v2':
+                # Older format: v2$hex salt$hex hash (the hex salt text itself is the PBKDF2 salt)
+                return 'sha512', parts[1].encode('utf-8'), bytes.fromhex(parts[2])
+            if len(parts) == 2:
+                # Legacy format: hex salt$hex hash
+                return 'sha256', parts[0].encode('utf-8'), bytes.fromhex(parts[1])
+        except (binascii.Error, ValueError):
+            return None  # Corrupt base64 or hex
+        return None  # Unknown hash format
+
+    def check_passkey_hash(passkey, algorithm, salt, hashed):
+        """Recreate hash with same salt and compare in constant time"""
+        if algorithm is None:
+            kdf = PBKDF2HMAC(algorithm=hashes.SHA512(), length=32, salt=salt, iterations=PBKDF2_ITERATIONS)
+            derived = kdf.derive(passkey)
+        else:
+            derived = hash_legacy_passkey(passkey, salt, algorithm)
+        return hmac.compare_digest(derived, hashed)
+
+    def cache_probe(passkey, salt):
+        """Keyed HMAC of passkey and salt; useless offline without the pepper"""
+        return hmac.new(st.session_state.pepper, salt + b"$" + passkey, hashlib.sha256).digest()
+
+    def cache_lookup(passkey, salt, hashed):
+        """Fast path: a cheap probe of a passkey already verified this session"""
+        cache = st.session_state.pbkdf2_cache
+        probe = cache_probe(passkey, salt)
+        cached = cache.get((salt, probe))
+        if cached is not None and hmac.compare_digest(cached, hashed):
+            cache.move_to_end((salt, probe))  # Mark as most recently used
+            return True
+        return False
+
+    def cache_store(passkey, salt, hashed):
+        """Remember a verified hash, evicting the oldest entry when full"""
+        cache = st.session_state.pbkdf2_cache
+        probe = cache_probe(passkey, salt)
+        cache[(salt, probe)] = hashed
+        cache.move_to_end((salt, probe))
+        if len(cache) > PBKDF2_CACHE_SIZE:
+            cache.popitem(last=False)
 
     def verify_passkey(passkey, stored_hash):
         """Verify a passkey against a stored hash"""
-        if not stored_hash or '$' not in stored_hash:
-            return False  # Invalid hash format
-        salt, hashed = stored_hash.split('$')  # Split salt and hash
-        new_hash = hash_passkey(passkey, salt)  # Recreate hash with same salt
-        return new_hash == stored_hash  # Compare with stored hash
+        parsed = parse_stored_hash(stored_hash)
+        if parsed is None:
+            return False
+        passkey = passkey.encode('utf-8')  # Encode once for every code path below
+        algorithm, salt, hashed = parsed
+        if cache_lookup(passkey, salt, hashed):
+            return True
+        if not check_passkey_hash(passkey, algorithm, salt, hashed):
+            return False
+        cache_store(passkey, salt, hashed)
+        return True
 
     # Encryption functions
     def encrypt_data(text, passkey):
         """Encrypt text data and return encrypted text with hashed passkey"""
         encrypted_text = cipher.encrypt(text.encode()).decode()  # Encrypt and decode to string
-        hashed_passkey = hash_passkey(passkey)  # Hash the passkey for storage
+        hashed_passkey = hash_passkey(passkey.encode('utf-8'))  # Hash the passkey for storage
         return encrypted_text, hashed_passkey
 
     def decrypt_data(encrypted_text, passkey):
         """Decrypt data if passkey is correct, handles lockout logic"""
         # Check if user is locked out
         if st.session_state.locked_out:
-            remaining_time = LOCKOUT_TIME - (datetime.now() - st.session_state.lockout_time).total_seconds()
+            remaining_time = LOCKOUT_TIME - (time.monotonic() - st.session_state.lockout_time)
             if remaining_time > 0:
                 st.error(f"🔒 Account locked. Please try again in {int(remaining_time//60)} minutes and {int(remaining_time%60)} seconds.")
                 return None
@@ -303,20 +505,24 @@ def main():
                 st.session_state.failed_attempts = 0
                 st.session_state.lockout_time = None
         
-        # Check all stored data entries for a match
-        for key, value in stored_data.items():
-            if value["encrypted_text"] == encrypted_text and verify_passkey(passkey, value["passkey"]):
-                st.session_state.failed_attempts = 0  # Reset attempts on success
-                try:
-                    return cipher.decrypt(encrypted_text.encode()).decode()  # Decrypt and return
-                except:
-                    return None  # Decryption failed
+        # Look up the entry for this ciphertext and verify its passkey once
+        name = ct_index.get(encrypted_text)
+        if name is not None and verify_passkey(passkey, stored_data[name]["passkey"]):
+            if not stored_data[name]["passkey"].startswith("v3$"):
+                # Rehash hex-salted legacy entries so later checks use the raw-salt format
+                stored_data[name]["passkey"] = hash_passkey(passkey.encode('utf-8'))
+                save_data(name, stored_data[name])
+            st.session_state.failed_attempts = 0  # Reset attempts on success
+            try:
+                return cipher.decrypt(encrypted_text.encode()).decode()  # Decrypt and return
+            except:
+                return None  # Decryption failed
         
         # If no match found, increment failed attempts
         st.session_state.failed_attempts += 1
         if st.session_state.failed_attempts >= MAX_ATTEMPTS:
             st.session_state.locked_out = True
-            st.session_state.lockout_time = datetime.now()
+            st.session_state.lockout_time = time.monotonic()  # Immune to wall-clock changes
             st.error("🔒 Too many failed attempts! Account locked for 5 minutes.")
         return None
 
@@ -326,12 +532,7 @@ def main():
 
     # Navigation sidebar
     with st.sidebar:
-        st.markdown("""
-        <div class="sidebar-header" style="margin-bottom: 20px;">
-            <h1 style="margin-bottom: 0;">🔐 Secure Vault</h1>
-            <p class="subtitle" style="margin-top: 0; color: #666; font-size: 14px;">Military-Grade Data Protection</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(SIDEBAR_HEADER_HTML, unsafe_allow_html=True)
         
         # Show limited options if locked out
         if st.session_state.locked_out:
@@ -344,44 +545,12 @@ def main():
     # Main Content - Different views based on menu choice
     if st.session_state.menu_choice == "Dashboard":
         # Dashboard view showing stats and info
-        st.markdown("""
-        <div style="margin-bottom: 30px;">
-            <h1 style="margin-bottom: 5px;">Dashboard</h1>
-            <div style="display: flex; gap: 20px; margin-top: 20px;">
-                <div style="background: white; padding: 15px; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); width: 200px;">
-                    <p style="margin: 0; font-size: 14px; color: #666;">Security System</p>
-                    <p style="margin: 5px 0 0; font-size: 16px; font-weight: bold; color: #4CAF50;">Active</p>
-                </div>
-                <div style="background: white; padding: 15px; border-radius: 10px; box-shadow: 0 2px 8px rgba(0,0,0,0.1); width: 200px;">
-                    <p style="margin: 0; font-size: 14px; color: #666;">Encrypted Items</p>
-                    <p style="margin: 5px 0 0; font-size: 16px; font-weight: bold;">{}</p>
-                </div>
-            </div>
-        </div>
-        """.format(len(stored_data)), unsafe_allow_html=True)
+        st.markdown(DASHBOARD_STATS_HTML.format(len(stored_data)), unsafe_allow_html=True)
 
         # Create three info cards
-        cols = st.columns(3)
-        with cols[0]:
-            st.markdown(card_component(
-                "Bank-Level Security",
-                "AES-256 encryption with PBKDF2 key derivation",
-                "🛡️"
-            ), unsafe_allow_html=True)
-        
-        with cols[1]:
-            st.markdown(card_component(
-                "Zero-Knowledge Protocol",
-                "We never store or see your passkeys",
-                "🔒"
-            ), unsafe_allow_html=True)
-        
-        with cols[2]:
-            st.markdown(card_component(
-                "Military Compliance",
-                "Meets strictest security standards",
-                "🎖️"
-            ), unsafe_allow_html=True)
+        for col, card_html in zip(st.columns(3), DASHBOARD_CARDS_HTML):
+            with col:
+                st.markdown(card_html, unsafe_allow_html=True)
 
     elif st.session_state.menu_choice == "Store Data":
         # Data encryption and storage view
@@ -512,9 +681,11 @@ def main():
                                 stored_data[key] = {
                                     "encrypted_text": encrypted_text,
                                     "passkey": hashed_passkey,
-                                    "timestamp": datetime.now().isoformat()
+                                    "timestamp": datetime.now().isoformat(),
+                                    "preview": make_preview(encrypted_text)
                                 }
-                                save_data(stored_data)
+                                ct_index[encrypted_text] = key
+                                save_data(key, stored_data[key])
                                 
                                 # Show success message with encrypted data
                                 with st.expander("🔐 Your Encrypted Data", expanded=True):
@@ -724,6 +895,7 @@ def main():
     # View showing all stored encrypted items
         st.markdown(gradient_text("Your Secure Data Vault", "#f46b45", "#eea849", "vault_header"), unsafe_allow_html=True)
     
+        page_names = []
         if not stored_data:
             st.info("ℹ️ Your vault is empty. Store some data to see it here.")
         else:
@@ -736,14 +908,35 @@ def main():
             </div>
         </div>
         """, unsafe_allow_html=True)
-        
-        # List all stored items in expanders
-        for name, data in stored_data.items():
+
+            # Filter by name, then list only the current page of items in expanders
+            search = st.text_input(
+                "Search by name:",
+                placeholder="Filter stored items...",
+                key="vault_search"
+            )
+            names = [name for name in stored_data if search.lower() in name.lower()]
+            if not names:
+                st.info("ℹ️ No stored items match your search.")
+            page_count = max(1, -(-len(names) // VAULT_PAGE_SIZE))  # Ceiling division
+            if st.session_state.get("vault_page", 1) > page_count:
+                st.session_state.vault_page = page_count  # Keep the page valid after filtering
+            page = st.number_input(
+                f"Page (of {page_count}):",
+                min_value=1,
+                max_value=page_count,
+                step=1,
+                key="vault_page"
+            )
+            page_names = names[(page - 1) * VAULT_PAGE_SIZE:page * VAULT_PAGE_SIZE]
+
+        for name in page_names:
+            data = stored_data[name]
             with st.expander(f"🔒 {name}", expanded=False):
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     # Show truncated encrypted data
-                    st.code(data["encrypted_text"][:200] + "..." if len(data["encrypted_text"]) > 200 else data["encrypted_text"])
+                    st.code(data["preview"])
                     st.caption(f"Stored on: {datetime.fromisoformat(data['timestamp']).strftime('%Y-%m-%d %H:%M:%S')}")
                          
                     with col2:
@@ -787,7 +980,7 @@ def main():
         
         # Check lockout status
         if st.session_state.locked_out:
-            remaining_time = LOCKOUT_TIME - (datetime.now() - st.session_state.lockout_time).total_seconds()
+            remaining_time = LOCKOUT_TIME - (time.monotonic() - st.session_state.lockout_time)
             if remaining_time > 0:
                 # Show lockout message
                 with stylable_container(